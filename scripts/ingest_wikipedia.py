@@ -5,6 +5,7 @@ import argparse
 import sys
 from textwrap import shorten
 from pathlib import Path
+from typing import TYPE_CHECKING, Tuple
 
 # --- make 'src' importable ---
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -12,28 +13,37 @@ SYS_SRC = PROJECT_ROOT / "src"
 if str(SYS_SRC) not in sys.path:
     sys.path.insert(0, str(SYS_SRC))
 
-# Orchestrator API
-from whiteboard.retrieval import is_indexed, reingest, get_chunks
-# For counting/diagnostics
-from whiteboard.index.milvus_store import MilvusStore
-from whiteboard.embeddings.model import Embedder
+# Heavy imports (torch, sentence-transformers, pymilvus) happen inside main(),
+# after argument parsing, so `--help` and usage errors return immediately.
+if TYPE_CHECKING:
+    from whiteboard.index.milvus_store import MilvusStore
 
 
 
-def _count_chunks(store: MilvusStore, topic: str) -> int:
+def _count_chunks(store: MilvusStore, topic: str) -> Tuple[int, bool]:
     """
-    Count stored chunks for a topic (best-effort within Milvus query window).
-    Milvus enforces (offset + limit) <= 16384, so we cap the query.
-    Returns the count up to 16384; if you need exact counts beyond that,
-    prefer an aggregation or stats API.
+    Count stored chunks for a topic -> (count, capped).
+    Uses the server-side `count(*)` aggregate (Milvus >= 2.3), which returns a
+    single row instead of shipping every chunk_id over the wire.
+    Older servers fall back to fetching ids, capped by the Milvus query window
+    ((offset + limit) <= 16384), so that path returns at most 16384; `capped` is
+    True when it hit that limit.
+    Session consistency: ingestion no longer flushes, so this sees the just-upserted rows.
     """
     expr = f'topic == "{topic.strip()}"'
     try:
-        rows = store.col.query(expr=expr, output_fields=["chunk_id"], limit=16384)
-        return len(rows)
+        rows = store.col.query(expr=expr, output_fields=["count(*)"], consistency_level="Session")
+        return int(rows[0]["count(*)"]), False
+    except Exception:
+        pass
+    try:
+        rows = store.col.query(
+            expr=expr, output_fields=["chunk_id"], limit=16384, consistency_level="Session"
+        )
+        return len(rows), len(rows) == 16384
     except Exception as e:
         print(f"[warn] count failed: {e}")
-        return -1
+        return -1, False
 
 
 
@@ -49,6 +59,11 @@ def main() -> int:
         print("Topic must be a non-empty string.")
         return 2
 
+    # Orchestrator API
+    from whiteboard.retrieval import is_indexed, reingest, get_chunks
+    # For counting/diagnostics
+    from whiteboard.index.milvus_store import MilvusStore
+
     store = MilvusStore()  # uses MILVUS_HOST/PORT from env
     already = is_indexed(topic)
 
@@ -60,9 +75,9 @@ def main() -> int:
     else:
         print(f"Topic {topic!r} already indexed. Skipping ingestion.")
 
-    n = _count_chunks(store, topic)
+    n, capped = _count_chunks(store, topic)
     if n >= 0:
-        suffix = " (>=16384; capped by Milvus window)" if n == 16384 else ""
+        suffix = " (>=16384; capped by Milvus window)" if capped else ""
         print(f"Ingested chunks for {topic!r}: {n}{suffix}")
 
 
@@ -0,0 +1,82 @@
+# scripts/ingest_wikipedia_batch.py
+from __future__ import annotations
+
+import argparse
+import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+# --- make 'src' importable ---
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SYS_SRC = PROJECT_ROOT / "src"
+if str(SYS_SRC) not in sys.path:
+    sys.path.insert(0, str(SYS_SRC))
+
+
+
+def _read_topics(path: Path) -> List[str]:
+    """One topic per line; blank lines and '#' comments are ignored, duplicates dropped."""
+    seen = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        topic = line.split("#", 1)[0].strip()
+        if topic:
+            seen.setdefault(topic, None)
+    return list(seen)
+
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Ingest many Wikipedia topics into Milvus (pages prefetched in the background).")
+    parser.add_argument("topics_file", type=Path, help="Text file with one topic title per line.")
+    parser.add_argument("--force", action="store_true", help="Force re-ingestion of topics that are already indexed.")
+    parser.add_argument("--prefetch", type=int, default=4, help="How many upcoming pages to fetch while the current topic is embedded.")
+    args = parser.parse_args()
+
+    if not args.topics_file.is_file():
+        print(f"Topics file not found: {args.topics_file}")
+        return 2
+    topics = _read_topics(args.topics_file)
+    if not topics:
+        print("No topics found in file.")
+        return 2
+
+    # Heavy imports after argument parsing
+    from whiteboard.retrieval import RetrievalService
+    from whiteboard.ingestion.wikipedia import fetch as wiki_fetch
+
+    svc = RetrievalService()
+    todo = [t for t in topics if args.force or not svc.is_indexed(t)]
+    print(f"{len(todo)}/{len(topics)} topics to ingest.")
+
+    # Producer/consumer double buffer: network fetches for the next topics run in
+    # worker threads while the main thread chunks, embeds and upserts the current one.
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(args.prefetch, 1)) as pool:
+        upcoming = iter(todo)
+        pending = deque()
+        for topic in upcoming:
+            pending.append((topic, pool.submit(wiki_fetch, topic)))
+            if len(pending) >= max(args.prefetch, 1):
+                break
+
+        while pending:
+            topic, future = pending.popleft()
+            nxt = next(upcoming, None)
+            if nxt is not None:
+                pending.append((nxt, pool.submit(wiki_fetch, nxt)))
+            try:
+                article = future.result()
+                print(f"Ingesting topic: {topic!r} ...")
+                svc.ingest_article(topic, article, force=args.force)
+            except Exception as e:
+                failed += 1
+                print(f"[warn] {topic!r} failed: {e}")
+
+    print(f"\nDone. {len(todo) - failed} ingested, {failed} failed.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -11,11 +11,11 @@ SYS_SRC = PROJECT_ROOT / "src"
 if str(SYS_SRC) not in sys.path:
     sys.path.insert(0, str(SYS_SRC))
 
-from whiteboard.retrieval import get_chunks
-
-
 
 def main() -> int:
+    # Imported lazily: pulls in torch/sentence-transformers/pymilvus
+    from whiteboard.retrieval import get_chunks
+
     topic = "Linear algebra"
     query = "eigenvalues"
     k = 4
@@ -1,10 +1,10 @@
 # scripts/smoke.py
-import sys, os, time
+import sys, os
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
 
 from sentence_transformers import SentenceTransformer
 from pymilvus import connections, FieldSchema, CollectionSchema, DataType, Collection, utility
-from bs4 import BeautifulSoup
+from lxml import html as lxml_html
 import wikipedia
 
 # 1) Embeddings load + encode
@@ -17,7 +17,9 @@ print(f"[OK] sentence-transformers loaded, dim={dim}, sample vec shape={vecs.sha
 # 2) Wikipedia fetch + HTML parse (needs internet)
 page = wikipedia.page(title="Linear algebra", auto_suggest=False, redirect=True)
 html = page.html()
-text = BeautifulSoup(html, "lxml").get_text(" ", strip=True)
+# Walk lxml's text nodes directly (no per-node BeautifulSoup objects); skip script/style like get_text()
+doc = lxml_html.fromstring(html)
+text = " ".join(t.strip() for t in doc.xpath(".//text()[not(ancestor::script) and not(ancestor::style)]") if t.strip())
 print(f"[OK] wikipedia fetch: {page.title}, text chars={len(text)}")
 
 # 3) Milvus round-trip: create → insert → search
@@ -41,10 +43,9 @@ entities = [vecs.tolist(), ["hello world", "linear algebra is about vector space
 # auto_id=True → omit ids
 col.insert(entities)
 
-# search
-time.sleep(0.5)  # small wait for insert visibility
+# search (Strong consistency guarantees the search sees the insert; no flush/sleep needed)
 q = model.encode(["what is linear algebra?"], normalize_embeddings=True)
-res = col.search(data=q.tolist(), anns_field="vector", param={"nprobe": 16}, limit=2, output_fields=["text"])
+res = col.search(data=q.tolist(), anns_field="vector", param={"nprobe": 16}, limit=2, output_fields=["text"], consistency_level="Strong")
 print(f"[OK] milvus search top hits: {[hit.entity.get('text') for hit in res[0]]}")
 
 print("\nALL GOOD ✅")
@@ -7,8 +7,6 @@ project_root = Path(__file__).resolve().parents[1]
 src_path = project_root / "src"
 sys.path.insert(0, str(src_path))
 
-from whiteboard.content_generator import generate_content_for_topic, fetch_lessons
-
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,6 +18,9 @@ def main():
         sys.exit(1)
     
     test_topic = sys.argv[1]
+
+    # Imported lazily: connects to Hugging Face/Supabase and loads the retrieval stack
+    from whiteboard.content_generator import generate_content_for_topic, fetch_lessons
     
     logger.info(f"Testing content generation for topic: {test_topic}")
     logger.info("This may take a few moments to query the Hugging Face API...")
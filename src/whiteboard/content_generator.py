@@ -2,6 +2,7 @@ from __future__ import annotations
 import logging
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 import re
 from huggingface_hub import InferenceClient
 import os
@@ -22,6 +23,8 @@ logger = logging.getLogger(__name__)
 
 MODEL_NAME = "mistralai/Mixtral-8x7B-Instruct-v0.1"  # Model supports conversational task
 HF_API_TOKEN = os.getenv("HF_API_TOKEN")
+# Prompt budget for retrieved context, in tokens (whole chunks only)
+CONTEXT_TOKEN_BUDGET = 3500
 
 client = None
 
@@ -90,6 +93,89 @@ Lesson:
 {lesson}
 """
 
+# ---------------- Quiz Parsing ----------------
+
+# One split on the field keywords turns the model output into
+# [preamble, keyword, text, keyword, text, ...]; option lists split on "A)".."D)".
+# The first label may appear anywhere (e.g. "(A) ..."); later ones must follow whitespace.
+_QUIZ_FIELD = re.compile(r'(QUESTION:|OPTIONS:|ANSWER:)')
+_FIRST_OPT_LABEL = re.compile(r'[A-D]\)')
+_OPT_LABEL = re.compile(r'(?:^|\s+)([A-D])\)')
+
+
+def _parse_options(options_text: str) -> Dict[str, str]:
+    first = _FIRST_OPT_LABEL.search(options_text)
+    if first is None:
+        return {}
+    parts = _OPT_LABEL.split(options_text[first.start():].rstrip())
+    return {parts[i]: parts[i + 1].strip() for i in range(1, len(parts) - 1, 2)}
+
+
+def _finish_question(fields: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    question = fields["QUESTION:"].strip()
+    if "ANSWER:" not in fields:
+        return None
+    correct_answer = fields["ANSWER:"].strip()
+
+    if "OPTIONS:" in fields:
+        # Multiple choice question
+        options = _parse_options(fields["OPTIONS:"])
+        if question and options and correct_answer:
+            return {
+                "type": "multiple_choice",
+                "question": question,
+                "options": options,
+                "correct_answer": correct_answer
+            }
+        return None
+
+    # Open-ended question
+    return {
+        "type": "open_ended",
+        "question": question,
+        "options": None,
+        "correct_answer": correct_answer
+    }
+
+
+def _parse_quiz(quiz_text: str) -> List[Dict[str, Any]]:
+    """
+    Single linear pass over the model output.
+    Each QUESTION: opens a block; OPTIONS: and ANSWER: fill it in order. Anything
+    after the ANSWER: (or a repeated keyword) belongs to the field being read, and
+    the block closes at the next QUESTION: or the end of the text.
+    """
+    questions = []
+    blocks: List[Dict[str, str]] = []
+    current = None
+    field = None
+
+    parts = _QUIZ_FIELD.split(quiz_text)
+    for i in range(1, len(parts), 2):
+        keyword, text = parts[i], parts[i + 1]
+        if keyword == "QUESTION:":
+            current = {keyword: text}
+            field = keyword
+            blocks.append(current)
+        elif current is None:
+            continue  # preamble before the first question
+        elif keyword in current or "ANSWER:" in current:
+            current[field] += keyword + text
+        else:
+            current[keyword] = text
+            field = keyword
+
+    for fields in blocks:
+        try:
+            parsed = _finish_question(fields)
+        except Exception as e:
+            logger.warning(f"Failed to parse block: QUESTION:{fields['QUESTION:'][:100]}... ({e})")
+            continue
+        if parsed:
+            questions.append(parsed)
+    return questions
+
+
 # ---------------- Core Generation Functions ----------------
 
 def _generate_text(prompt: str, max_new_tokens: int = 1024) -> str:
@@ -119,26 +205,36 @@ def _generate_text(prompt: str, max_new_tokens: int = 1024) -> str:
         raise
 
 def generate_lesson_from_chunks(retrieved_chunks: List[Dict[str, Any]]) -> str:
-    context = "\n\n".join([chunk['text'] for chunk in retrieved_chunks])
     # Log the structure of retrieved_chunks for debugging
     logger.info(f"Retrieved chunks structure: {[chunk.keys() for chunk in retrieved_chunks]}")
     logger.info(f"Source sample: {[chunk.get('source', 'No source') for chunk in retrieved_chunks]}")
     
     # Extract source information from chunks, handling missing or incomplete source data
-    sources = "\n".join([
-        (
-            f"- {chunk.get('source', {}).get('title', 'Unknown Title')} "
-            f"({chunk.get('source', {}).get('url', 'No URL provided')})"
-            f"{', Section: ' + chunk['source']['section'] if chunk.get('source', {}).get('section') else ''}"
-            if chunk.get('source', {}) and any(chunk.get('source', {}).get(key) for key in ['title', 'url', 'section'])
-            else f"- {chunk['text'][:50].strip()}... (No source metadata provided)"
-        )
-        for chunk in retrieved_chunks
-    ])
-    # Truncate context to avoid exceeding API limits
-    if len(context) > 4000:
-        logger.warning("Context is very long. Truncating...")
-        context = context[:4000]
+    source_lines = []
+    for chunk in retrieved_chunks:
+        src = chunk.get('source') or {}
+        title, url, section = src.get('title'), src.get('url'), src.get('section')
+        if title or url or section:
+            source_lines.append(
+                f"- {title or 'Unknown Title'} ({url or 'No URL provided'})"
+                f"{', Section: ' + section if section else ''}"
+            )
+        else:
+            source_lines.append(f"- {chunk['text'][:50].strip()}... (No source metadata provided)")
+    sources = "\n".join(source_lines)
+
+    # Pack whole chunks (in rank order) until the token budget is spent, to avoid exceeding API limits.
+    # Each chunk carries its embedder token count, a close proxy for the LLM tokenizer.
+    kept = []
+    used = 0
+    for chunk in retrieved_chunks:
+        n_tokens = int(chunk.get('tokens') or 0) or len(chunk['text']) // 4
+        if kept and used + n_tokens > CONTEXT_TOKEN_BUDGET:
+            logger.warning("Context is very long. Truncating...")
+            break
+        kept.append(chunk['text'])
+        used += n_tokens
+    context = "\n\n".join(kept)
     
     prompt = _PROMPT_TEMPLATE_LESSON.format(context=context, sources=sources)
     lesson_text = _generate_text(prompt, max_new_tokens=1500)
@@ -149,99 +245,51 @@ def generate_quiz_from_lesson(lesson_text: str) -> Dict[str, Any]:
     quiz_text = _generate_text(prompt, max_new_tokens=512)
     logger.info(f"Raw quiz output from model: {quiz_text}")
 
-    questions = []
-    
-    # Split by QUESTION: to separate each question block
-    question_blocks = re.split(r'(?=QUESTION:)', quiz_text)
-    
-    for block in question_blocks:
-        block = block.strip()
-        if not block or not block.startswith("QUESTION:"):
-            continue
-            
-        try:
-            # Extract question
-            question_match = re.search(r'QUESTION:\s*(.*?)(?=OPTIONS:|ANSWER:|$)', block, re.DOTALL)
-            if not question_match:
-                continue
-            question = question_match.group(1).strip()
-            
-            # Check if it's multiple choice or open-ended
-            if "OPTIONS:" in block:
-                # Multiple choice question
-                options_match = re.search(r'OPTIONS:\s*(.*?)(?=ANSWER:|$)', block, re.DOTALL)
-                answer_match = re.search(r'ANSWER:\s*(.*?)$', block, re.DOTALL)
-                
-                if not options_match or not answer_match:
-                    continue
-                    
-                options_text = options_match.group(1).strip()
-                correct_answer = answer_match.group(1).strip()
-                
-                # Parse options using regex
-                options = {}
-                option_pattern = r'([A-D])\)\s*(.*?)(?=\s+[A-D]\)|$)'
-                for match in re.finditer(option_pattern, options_text):
-                    option_letter = match.group(1)
-                    option_text = match.group(2).strip()
-                    options[option_letter] = option_text
-                
-                if question and options and correct_answer:
-                    questions.append({
-                        "type": "multiple_choice",
-                        "question": question,
-                        "options": options,
-                        "correct_answer": correct_answer
-                    })
-                    
-            else:
-                # Open-ended question
-                answer_match = re.search(r'ANSWER:\s*(.*?)$', block, re.DOTALL)
-                if answer_match:
-                    correct_answer = answer_match.group(1).strip()
-                    questions.append({
-                        "type": "open_ended",
-                        "question": question,
-                        "options": None,
-                        "correct_answer": correct_answer
-                    })
-                    
-        except Exception as e:
-            logger.warning(f"Failed to parse block: {block[:100]}... ({e})")
-            continue
-
+    questions = _parse_quiz(quiz_text)
     return {"quiz": questions}
 
 # ---------------- Supabase Functions ----------------
 
-def save_content(content: GeneratedContent) -> bool:
+def _content_row(content: GeneratedContent) -> Optional[Dict[str, Any]]:
+    # Validate required fields
+    if not content.topic or not content.lesson or not content.quiz:
+        logger.error("Missing required fields in content object.")
+        logger.error(f"Topic: {content.topic}, Lesson: {len(content.lesson) if content.lesson else None}, Quiz: {content.quiz}")
+        return None
+    return {
+        "topic": content.topic,
+        "lesson": content.lesson,
+        "quiz": content.quiz,
+        "retrieved_chunks": content.retrieved_chunks,
+    }
+
+def save_contents(contents: List[GeneratedContent]) -> bool:
     """
-    Save generated content to the Supabase lessons table.
+    Save several generated contents to the Supabase lessons table in one bulk insert
+    (one HTTPS round trip instead of one per lesson). Invalid entries are logged and skipped.
     Returns True if successful, False otherwise.
     """
     try:
-        # Validate required fields
-        if not content.topic or not content.lesson or not content.quiz:
-            logger.error("Missing required fields in content object.")
-            logger.error(f"Topic: {content.topic}, Lesson: {len(content.lesson) if content.lesson else None}, Quiz: {content.quiz}")
+        rows = [row for row in (_content_row(c) for c in contents) if row is not None]
+        if not rows:
             return False
+        logger.info(f"Attempting to insert {len(rows)} rows into lessons table: {[r['topic'] for r in rows]}")
 
-        data = {
-            "topic": content.topic,
-            "lesson": content.lesson,
-            "quiz": content.quiz,
-            "retrieved_chunks": content.retrieved_chunks,
-        }
-        logger.info(f"Attempting to insert data into lessons table: {data}")
-        
-        response = supabase.table("lessons").insert(data).execute()
-        logger.info(f"Insert successful: {response.data}")
-        return True
+        response = supabase.table("lessons").insert(rows).execute()
+        logger.info(f"Insert successful: {len(response.data)} rows")
+        return len(rows) == len(contents)
     except Exception as e:
         logger.error(f"Failed to save content to Supabase: {e}")
         logger.error("Check Supabase URL, key, table permissions, and schema.")
         return False
 
+def save_content(content: GeneratedContent) -> bool:
+    """
+    Save generated content to the Supabase lessons table.
+    Returns True if successful, False otherwise.
+    """
+    return save_contents([content])
+
 def fetch_lessons() -> List[Dict[str, Any]]:
     """
     Fetch all lessons from the Supabase lessons table, ordered by created_at descending.
@@ -263,7 +311,7 @@ class GeneratedContent:
     quiz: Dict[str, Any]
     retrieved_chunks: List[Dict[str, Any]]
 
-def generate_content_for_topic(topic: str, query: str | None = None, k: int = 6) -> GeneratedContent:
+def _build_content(topic: str, query: str | None, k: int) -> GeneratedContent:
     logger.info(f"Generating content for topic: {topic}")
     retrieved_chunks = get_chunks(topic, query=query, k=k)
     logger.info(f"Retrieved {len(retrieved_chunks)} chunks.")
@@ -271,15 +319,47 @@ def generate_content_for_topic(topic: str, query: str | None = None, k: int = 6)
     logger.info("Lesson generated successfully.")
     quiz_data = generate_quiz_from_lesson(lesson_text)
     logger.info(f"Quiz generated with {len(quiz_data.get('quiz', []))} questions.")
-    content = GeneratedContent(
+    return GeneratedContent(
         topic=topic,
         lesson=lesson_text,
         quiz=quiz_data,
         retrieved_chunks=retrieved_chunks
     )
+
+def generate_content_for_topic(topic: str, query: str | None = None, k: int = 6) -> GeneratedContent:
+    content = _build_content(topic, query, k)
     # Save to Supabase
     if save_content(content):
         logger.info(f"Content for topic '{topic}' saved to Supabase.")
     else:
         logger.error(f"Failed to save content for topic '{topic}' to Supabase.")
-    return content
\ No newline at end of file
+    return content
+
+def generate_content_for_topics(
+    topics: List[str], query: str | None = None, k: int = 6, max_workers: int = 8
+) -> List[GeneratedContent]:
+    """
+    Batch entry point: generates content for each topic in a thread pool, then saves
+    everything with a single bulk insert.
+    The Hugging Face calls are blocking network I/O (the GIL is released), so
+    independent topics overlap. Failed topics are logged and skipped; results keep
+    the input order.
+    """
+    results: List[GeneratedContent] = []
+    if not topics:
+        return results
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(topics)))) as pool:
+        futures = [pool.submit(_build_content, topic, query, k) for topic in topics]
+    for topic, future in zip(topics, futures):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            logger.error(f"Content generation failed for topic '{topic}': {e}")
+    logger.info(f"Generated content for {len(results)}/{len(topics)} topics.")
+
+    # Save to Supabase
+    if results and save_contents(results):
+        logger.info(f"Content for {len(results)} topics saved to Supabase.")
+    elif results:
+        logger.error("Failed to save some or all batch content to Supabase.")
+    return results
@@ -0,0 +1,60 @@
+# src/whiteboard/embeddings/cache.py
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# SQLite caps bound parameters per statement (999 on older builds)
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Persistent text -> vector cache in a single SQLite file under `directory`.
+
+    - Keys: blake2b-128 of "<namespace>|<text>" (namespace pins model/config)
+    - Values: raw float32 bytes, returned exactly as they were encoded
+    - Safe to share across threads (one connection guarded by a lock)
+    """
+
+    def __init__(self, directory: str, namespace: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, "embeddings.sqlite3")
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS vectors (key BLOB PRIMARY KEY, vec BLOB NOT NULL)")
+        self._conn.commit()
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.blake2b(f"{self.namespace}|{text}".encode("utf-8"), digest_size=16).digest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Vectors for `texts` in order; None where not cached."""
+        keys = [self._key(t) for t in texts]
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i : i + _SQL_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT key, vec FROM vectors WHERE key IN ({marks})", batch)
+                found.update(rows.fetchall())
+        return [
+            np.frombuffer(found[k], dtype=np.float32) if k in found else None
+            for k in keys
+        ]
+
+    def put_many(self, texts: Sequence[str], vectors: np.ndarray) -> None:
+        rows = [
+            (self._key(t), np.ascontiguousarray(v, dtype=np.float32).tobytes())
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO vectors (key, vec) VALUES (?, ?)", rows)
+            self._conn.commit()
@@ -1,31 +1,93 @@
 # src/whiteboard/embeddings/model.py
 from __future__ import annotations
 
+import functools
 import os
-from typing import Iterable, List, Optional
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Iterable, List, Optional, Tuple
 
 import numpy as np
 import torch
 from sentence_transformers import SentenceTransformer
 
+from .cache import EmbeddingCache
+
+
+# EMBED_DTYPE values -> torch dtypes used for the model weights/activations.
+_DTYPES = {
+    "fp32": torch.float32,
+    "fp16": torch.float16,
+    "bf16": torch.bfloat16,
+}
+
+# EMBED_BACKEND values; onnx/openvino need the matching sentence-transformers extra
+# (pip install "sentence-transformers[onnx]" or "sentence-transformers[openvino]").
+_BACKENDS = ("torch", "onnx", "openvino")
+
 
 def _env(name: str, default: Optional[str] = None) -> Optional[str]:
     v = os.getenv(name)
     return v if (v is not None and v != "") else default
 
 
+@functools.lru_cache(maxsize=4)
+def _load_model(
+    model_name: str,
+    device: str,
+    backend: str,
+    dtype: str,
+    max_seq_length: Optional[int],
+    compiled: bool = False,
+) -> SentenceTransformer:
+    """
+    Load (once per process) a SentenceTransformer configured for inference.
+    Keyed on everything that mutates the model, so Embedders that share a key
+    share the weights and differently-configured ones never step on each other.
+    """
+    if device.startswith("cuda"):
+        # Allow TF32 matmuls on Ampere+ for the fp32 path (no effect on fp16/bf16)
+        torch.set_float32_matmul_precision("high")
+    model = SentenceTransformer(model_name, device=device, backend=backend)
+    if dtype != "fp32":
+        model.to(_DTYPES[dtype])
+    if max_seq_length is not None:
+        # sentence-transformers exposes this property for truncation during encode()
+        model.max_seq_length = max_seq_length
+    model.eval()
+    if compiled:
+        # TorchInductor-fused transformer forward; the first encode per shape bucket pays
+        # the compile (persist it across runs with TORCHINDUCTOR_CACHE_DIR).
+        module = model[0]
+        module.auto_model = torch.compile(module.auto_model, dynamic=True)
+    return model
+
+
 class Embedder:
     """
     Thin wrapper over Sentence-Transformers with sensible defaults:
 
     - Model name from EMBED_MODEL (default: all-MiniLM-L6-v2)
     - Automatic device: cuda if available, else cpu (can override via EMBED_DEVICE)
+    - Inference backend from EMBED_BACKEND: torch (default), onnx or openvino
+    - Half precision on cuda (fp16 by default; EMBED_DTYPE=fp32|fp16|bf16), fp32 on cpu
+    - CPU thread count from EMBED_NUM_THREADS (default: torch's own choice)
+    - Optional torch.compile of the transformer on Ampere+ GPUs (EMBED_COMPILE=1)
+    - Optional persistent vector cache in EMBED_CACHE_DIR (off when unset)
+    - encode_one() calls from concurrent threads are coalesced into shared batches
+      (extra wait for stragglers via EMBED_MAX_WAIT_MS, default 0)
     - Optional vector L2-normalization (recommended for cosine search in Milvus)
     - Batch encoding with float32 output
 
     Public attributes:
       - model_name: str
       - max_seq_length: int
+      - backend: str ("torch" | "onnx" | "openvino")
+      - dtype: str ("fp32" | "fp16" | "bf16")
+      - compiled: bool
+      - cache: Optional[EmbeddingCache]
     """
 
     def __init__(
@@ -36,6 +98,11 @@ class Embedder:
         batch_size: Optional[int] = None,
         device: Optional[str] = None,
         max_seq_length: Optional[int] = None,
+        dtype: Optional[str] = None,
+        backend: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        max_wait_ms: Optional[float] = None,
+        compile_model: Optional[bool] = None,
     ) -> None:
         # Resolve config from environment with sane defaults
         self.model_name: str = model_name or _env("EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
@@ -44,8 +111,38 @@ class Embedder:
         env_device = _env("EMBED_DEVICE")
         self.device = device or env_device or ("cuda" if torch.cuda.is_available() else "cpu")
 
-        # Instantiate model
-        self.model = SentenceTransformer(self.model_name, device=self.device)
+        # Backend: ONNX Runtime / OpenVINO run the same weights with fused CPU kernels
+        backend = (backend or _env("EMBED_BACKEND") or "torch").strip().lower()
+        self.backend: str = backend if backend in _BACKENDS else "torch"
+
+        # Numeric precision: half precision halves weight/activation bandwidth on GPU
+        # with no practical recall loss for cosine search. CPU kernels stay fp32.
+        # Only applies to the torch backend (exported graphs carry their own dtype).
+        dtype = (dtype or _env("EMBED_DTYPE") or "").strip().lower()
+        if not self.device.startswith("cuda") or self.backend != "torch":
+            dtype = "fp32"
+        elif dtype not in _DTYPES:
+            dtype = "fp16"
+        self.dtype: str = dtype
+
+        # JIT compile (opt-in): only worth it where Inductor emits fused bf16/fp16 kernels
+        env_compile = _env("EMBED_COMPILE")
+        if compile_model is None and env_compile is not None:
+            compile_model = env_compile.strip().lower() in ("1", "true", "yes", "y", "on")
+        self.compiled: bool = bool(
+            compile_model
+            and self.backend == "torch"
+            and self.device.startswith("cuda")
+            and torch.cuda.get_device_capability(self.device)[0] >= 8
+        )
+
+        # CPU intra-op threads (torch defaults to the physical core count)
+        env_threads = _env("EMBED_NUM_THREADS")
+        if env_threads:
+            try:
+                torch.set_num_threads(max(int(env_threads), 1))
+            except ValueError:
+                pass
 
         # Respect max sequence length:
         # - If max_seq_length is provided (arg or env), set it explicitly.
@@ -56,9 +153,13 @@ class Embedder:
                 max_seq_length = int(env_max_len)
             except ValueError:
                 pass
-        if isinstance(max_seq_length, int) and max_seq_length > 0:
-            # sentence-transformers exposes this property for truncation during encode()
-            self.model.max_seq_length = max_seq_length
+        if not (isinstance(max_seq_length, int) and max_seq_length > 0):
+            max_seq_length = None
+
+        # Instantiate model (shared per process; repeat Embedders skip the reload)
+        self.model = _load_model(
+            self.model_name, self.device, self.backend, self.dtype, max_seq_length, self.compiled
+        )
 
         self.max_seq_length: int = int(getattr(self.model, "max_seq_length", 256))
 
@@ -78,32 +179,128 @@ class Embedder:
             normalize = s in ("1", "true", "yes", "y", "on")
         self.normalize = bool(normalize)
 
+        # Persistent cache: reruns (e.g. --force reingest) skip the forward pass.
+        # Namespaced by everything that changes the output vector.
+        cache_dir = cache_dir or _env("EMBED_CACHE_DIR")
+        self.cache: Optional[EmbeddingCache] = None
+        if cache_dir:
+            namespace = "|".join((
+                self.model_name,
+                self.backend,
+                self.dtype,
+                self.device.split(":")[0],  # cuda runs TF32 matmuls; cpu doesn't
+                str(int(self.compiled)),    # Inductor kernels change numerics slightly
+                str(self.max_seq_length),
+                str(int(self.normalize)),
+            ))
+            self.cache = EmbeddingCache(cache_dir, namespace)
+
+        # Dynamic batching for encode_one (worker thread starts on first use)
+        env_wait = _env("EMBED_MAX_WAIT_MS")
+        if max_wait_ms is None and env_wait:
+            try:
+                max_wait_ms = float(env_wait)
+            except ValueError:
+                pass
+        self.max_wait_ms = float(max_wait_ms) if isinstance(max_wait_ms, (int, float)) and max_wait_ms > 0 else 0.0
+        self._batcher: Optional[_MicroBatcher] = None
+        self._batcher_lock = threading.Lock()
+
     # ------------- public API -------------
 
     def encode(self, texts: Iterable[str]) -> np.ndarray:
         """
         Encode a batch of texts -> np.ndarray [n, d] float32.
         Applies optional L2 normalization (recommended for cosine).
+        Cached texts (if a cache is configured) skip the model entirely.
         """
-        # sentence-transformers can take iterables directly
-        vectors = self.model.encode(
-            list(texts),
-            batch_size=self.batch_size,
-            convert_to_numpy=True,
-            normalize_embeddings=False,  # we'll handle normalization explicitly
-            show_progress_bar=False,
-        ).astype(np.float32, copy=False)
-
-        if self.normalize:
-            vectors = _l2_normalize(vectors)
-        return vectors
+        texts = texts if isinstance(texts, list) else list(texts)
+        if self.cache is None or not texts:
+            return self._encode(texts)
+
+        cached = self.cache.get_many(texts)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if not missing:
+            return np.stack(cached)
+        fresh = self._encode([texts[i] for i in missing])
+        self.cache.put_many([texts[i] for i in missing], fresh)
+        if len(missing) == len(texts):
+            return fresh
+        for i, v in zip(missing, fresh):
+            cached[i] = v
+        return np.stack(cached)
 
     def encode_one(self, text: str) -> np.ndarray:
         """
         Encode a single text -> np.ndarray [d] float32.
+        Concurrent callers share one encode() batch instead of running batches of 1.
         """
-        vec = self.encode([text])
-        return vec[0]
+        if self._batcher is None:
+            with self._batcher_lock:
+                if self._batcher is None:
+                    self._batcher = _MicroBatcher(self.encode, self.batch_size, self.max_wait_ms / 1000.0)
+        return self._batcher.submit(text).result()
+
+    # ------------- internals -------------
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        # sentence-transformers already does "smart batching": encode() sorts inputs by
+        # length, pads each mini-batch only to its own max, and restores input order.
+        # Pre-sorting here would just repeat that work, so texts go through as-is.
+        # inference_mode also skips the version-counter/view tracking no_grad keeps
+        with torch.inference_mode():
+            vectors = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=self.normalize,  # normalized on the tensor, before the numpy copy
+                show_progress_bar=False,
+            )
+        if vectors.dtype != np.float32:
+            # fp16 models hand back float16; keep the float32 contract for callers
+            vectors = vectors.astype(np.float32)
+        return vectors
+
+
+class _MicroBatcher:
+    """
+    Dynamic batching: a daemon thread takes the oldest pending text, gathers
+    whatever else is queued (waiting up to `max_wait` seconds for more, capped at
+    `max_batch`), runs one encode() and resolves each caller's future with its row.
+    Under load, requests that arrive while a batch is encoding form the next one.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch: int, max_wait: float) -> None:
+        self._encode = encode
+        self._max_batch = max(int(max_batch), 1)
+        self._max_wait = max(float(max_wait), 0.0)
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedder-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        fut: Future = Future()
+        self._queue.put((text, fut))
+        return fut
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self._max_wait
+            while len(batch) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                vectors = self._encode([text for text, _ in batch])
+            except BaseException as e:  # noqa: BLE001 - surfaced to every waiting caller
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), vec in zip(batch, vectors):
+                fut.set_result(vec)
 
 
 # ------------- utils -------------
@@ -111,10 +308,15 @@ class Embedder:
 def _l2_normalize(x: np.ndarray, eps: float = 1e-12) -> np.ndarray:
     """
     Row-wise L2 normalization: each vector becomes unit length.
-    Safe for zero vectors.
+    Safe for zero vectors. `Embedder.encode` normalizes inside
+    sentence-transformers; this is kept for callers holding raw vectors.
+
+    Returns a new float32 array; `x` is never modified (it may be read-only,
+    e.g. vectors from `EmbeddingCache`). Squared norms come from one einsum pass.
     """
+    x = np.asarray(x, dtype=np.float32)
     if x.ndim == 1:
-        denom = float(np.linalg.norm(x) + eps)
-        return (x / denom).astype(np.float32, copy=False)
-    norms = np.linalg.norm(x, axis=1, keepdims=True) + eps
-    return (x / norms).astype(np.float32, copy=False)
\ No newline at end of file
+        return x / (float(np.sqrt(np.dot(x, x))) + eps)
+    norms = np.sqrt(np.einsum("ij,ij->i", x, x))
+    norms += eps
+    return x / norms[:, None]
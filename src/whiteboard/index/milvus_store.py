@@ -2,12 +2,15 @@
 from __future__ import annotations
 
 import os
+import threading
 import time
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 from pymilvus import (
     connections,
     FieldSchema, CollectionSchema, DataType, Collection,
+    MilvusException,
     utility
 )
 
@@ -25,34 +28,96 @@ _DEFAULT_DIM = 384
 # HNSW (COSINE) is a solid default for ST embeddings.
 _VEC_INDEX_TYPE = "HNSW"           # alternatives: "IVF_FLAT", "FLAT"
 _VEC_METRIC = "COSINE"             # aligns with sentence-transformers
-_HNSW_PARAMS = {"M": 16, "efConstruction": 200}
-_SEARCH_PARAMS = {"metric_type": _VEC_METRIC, "params": {"ef": 64}}
+# Build-heavy graph: topics are indexed once and queried often, so spend more at build
+# time for recall. M=24 takes ~50% more HNSW graph RAM than M=16; only applies to
+# newly built indexes (existing ones keep their params until dropped and rebuilt).
+_HNSW_PARAMS = {"M": 24, "efConstruction": 400}
+# Vectors are stored as FLOAT16_VECTOR (Milvus 2.4+): half the HNSW graph memory and
+# traversal bandwidth of FLOAT_VECTOR; recall loss on normalized MiniLM + COSINE is negligible.
+_VEC_FIELD_TYPE = DataType.FLOAT16_VECTOR
+# Search-time HNSW budget scales with k: ef = max(2*k, _MIN_EF) (Milvus requires ef >= k).
+# Small topic-scoped queries stay cheap; larger k widens the traversal.
+# The floor is tunable via WB_HNSW_EF (default 48).
+try:
+    _MIN_EF = max(int(os.getenv("WB_HNSW_EF", "48")), 1)
+except ValueError:
+    _MIN_EF = 48
+# Payload returned with each search hit
+_OUTPUT_FIELDS = ("chunk_id", "text", "tokens", "embedding_model", "url", "title", "section")
 
 # Scalar filtering uses boolean expressions like: topic == "Linear algebra"
 # (Milvus supports scalar filters during search.)  :contentReference[oaicite:3]{index=3}
+# The topic field gets a scalar index so that filter is an index lookup, not a per-row compare.
+# INVERTED needs Milvus 2.4+; TRIE is the older VARCHAR index.
+_TOPIC_INDEX_TYPES = ("INVERTED", "TRIE")
+# topic is the collection's partition key: Milvus hashes topics into this many
+# partitions and prunes a `topic == ...` search to the one holding that topic.
+_TOPIC_PARTITIONS = 64
+
+# Connection aliases opened by this process -> (host, port); every MilvusStore on an alias reuses it
+_CONNECTED: Dict[str, Tuple[str, str]] = {}
+_SETUP_LOCK = threading.Lock()
 
 class MilvusStore:
     """
     One-collection design:
-      - Vector field: embedding (FLOAT_VECTOR)
+      - Vector field: embedding (FLOAT16_VECTOR; older collections may be FLOAT_VECTOR)
       - Primary key: chunk_id (VarChar)
-      - Filterable scalar fields: topic, tokens, embedding_model
+      - Filterable scalar fields: topic (partition key), tokens, embedding_model
       - Payload: text, url, title, section, ingested_at
 
     Rationale:
-      - Use scalar filter `topic == ...` instead of many partitions for MVP. :contentReference[oaicite:4]{index=4}
+      - topic is a partition key rather than one named partition per topic: the
+        `topic == ...` filter prunes the search to a single hash partition (its own
+        segments and HNSW graphs), with no partition-name rules or partition-count
+        limit to manage. Collections created before this keep plain filtering. :contentReference[oaicite:4]{index=4}
       - HNSW index with COSINE for st-embeddings; IVF_FLAT/FLAT are alternatives. :contentReference[oaicite:5]{index=5}
     """
 
-    def __init__(self, collection: str = _DEFAULT_COLLECTION, dim: int = _DEFAULT_DIM):
+    # Ready (indexed + loaded) collection handles, shared per (alias, collection name)
+    _collections: Dict[Tuple[str, str], Collection] = {}
+
+    def __init__(
+        self,
+        collection: str = _DEFAULT_COLLECTION,
+        dim: int = _DEFAULT_DIM,
+        *,
+        alias: str = "default",
+        host: Optional[str] = None,
+        port: Optional[str] = None,
+    ):
         self.collection_name = collection
         self.dim = dim
-        # 1) connect once
-        connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
-        # 2) ensure collection + index
-        self.col = self._get_or_create_collection()
-        self._ensure_indexes()
-        self.col.load()
+        self.alias = alias
+        address = (host or MILVUS_HOST, str(port or MILVUS_PORT))
+        with _SETUP_LOCK:
+            # 1) connect once per alias per process
+            connected = _CONNECTED.get(alias)
+            if connected is None:
+                connections.connect(alias=alias, host=address[0], port=address[1])
+                _CONNECTED[alias] = address
+            elif connected != address:
+                raise ValueError(
+                    f"Milvus alias {alias!r} is already connected to {connected[0]}:{connected[1]}; "
+                    f"use another alias for {address[0]}:{address[1]}"
+                )
+            # 2) ensure collection + index + load, once per (alias, collection)
+            key = (alias, collection)
+            col = MilvusStore._collections.get(key)
+            if col is None:
+                self.col = self._get_or_create_collection()
+                self._ensure_indexes()
+                self.col.load()
+                col = MilvusStore._collections[key] = self.col
+        self.col = col
+        # numpy dtype matching the stored vector field (existing FLOAT_VECTOR collections keep float32)
+        vec_field = next(f for f in self.col.schema.fields if f.name == "embedding")
+        stored_dim = int(vec_field.params.get("dim", dim))
+        if stored_dim != dim:
+            raise ValueError(
+                f"Collection {collection!r} stores {stored_dim}-dim vectors, not {dim}"
+            )
+        self._vec_dtype = np.float16 if vec_field.dtype == DataType.FLOAT16_VECTOR else np.float32
 
     # ---------- public API ----------
 
@@ -64,76 +129,99 @@ class MilvusStore:
         topic = topic.strip()
         expr = f'topic == "{topic}"'
         try:
-            res = self.col.query(expr=expr, output_fields=["chunk_id"], limit=1, consistency_level="Bounded")
+            res = self.col.query(expr=expr, output_fields=["chunk_id"], limit=1, consistency_level="Session")
             return len(res) > 0
         except Exception:
             return False
 
     def upsert(self, *, topic: str, items: List[Dict], vectors, force: bool = False) -> None:
         """
-        Idempotent upsert: delete existing chunk_ids, then insert.
+        Idempotent upsert keyed by chunk_id (native Collection.upsert).
         - items[i] corresponds to vectors[i]
         Required item keys:
           chunk_id, text, tokens, url, title, section, embedding_model, ingested_at
+        No flush/load: Milvus seals segments on its own, a loaded collection stays
+        loaded across writes, and reads use Session consistency (read-your-writes).
         """
         if not items:
             return
 
-        chunk_ids = [it["chunk_id"] for it in items]
-        # Delete existing rows for these primary keys (if any)
-        # (Milvus doesn't have true upsert; delete+insert is standard.)
-        self._delete_by_ids(chunk_ids)
+        # Prepare column-wise data (Milvus ORM expects columnar order) in one pass over items.
+        n = len(items)
+        now = int(time.time())
+        chunk_ids: List[str] = [""] * n
+        texts: List[str] = [""] * n
+        models: List[str] = [""] * n
+        urls: List[str] = [""] * n
+        titles: List[str] = [""] * n
+        sections: List[str] = [""] * n
+        tokens: List[int] = [0] * n
+        ingested: List[int] = [now] * n
+        for i, it in enumerate(items):
+            chunk_ids[i] = it["chunk_id"]
+            texts[i] = it["text"]
+            tokens[i] = int(it.get("tokens", 0))
+            models[i] = it.get("embedding_model", "")
+            urls[i] = it.get("url", "")
+            titles[i] = it.get("title", "")
+            section = it.get("section")
+            sections[i] = section if section is not None else ""
+            ingested[i] = int(it.get("ingested_at", now))
 
-        # Prepare column-wise data (Milvus ORM expects columnar order)
         data = [
             chunk_ids,
-            [topic] * len(items),
-            [it["text"] for it in items],
-            [int(it.get("tokens", 0)) for it in items],
-            [it.get("embedding_model", "") for it in items],
-            [it.get("url", "") for it in items],
-            [it.get("title", "") for it in items],
-            [it.get("section") if it.get("section") is not None else "" for it in items],
-            [int(it.get("ingested_at", int(time.time()))) for it in items],
-            vectors,  # FLOAT_VECTOR
+            [topic] * n,
+            texts,
+            tokens,
+            models,
+            urls,
+            titles,
+            sections,
+            ingested,
+            list(np.asarray(vectors, dtype=self._vec_dtype)),  # one row array per entity
         ]
 
-        self.col.insert(data)
-        # No need to recreate index; just ensure collection stays loaded
-        self.col.flush()
-        self.col.load()
+        # Replaces existing rows with the same primary key, inserts the rest
+        self.col.upsert(data)
 
-    def search(self, *, topic: str, query_vector, k: int) -> List[Dict]:
+    def search(self, *, topic: str, query_vector, k: int, ef: Optional[int] = None) -> List[Dict]:
         """
         Topic-scoped similarity search with scalar filter.
         Returns list of dicts with payload + score.
+        `ef` (HNSW search budget) defaults to max(2*k, WB_HNSW_EF or 48); raise it for recall-critical queries.
         """
         topic = topic.strip()
         expr = f'topic == "{topic}"'
+        ef = max(int(ef) if ef else max(2 * k, _MIN_EF), k)
         results = self.col.search(
-            data=[query_vector.tolist() if hasattr(query_vector, "tolist") else list(query_vector)],
+            # One [1, dim] array in the stored field's dtype; pymilvus serializes its buffer as-is
+            data=np.asarray(query_vector, dtype=self._vec_dtype).reshape(1, -1),
             anns_field="embedding",
-            param=_SEARCH_PARAMS,
+            param={"metric_type": _VEC_METRIC, "params": {"ef": ef}},
             limit=k,
             expr=expr,
-            output_fields=["chunk_id", "text", "tokens", "embedding_model", "url", "title", "section"],
-            consistency_level="Bounded",
+            output_fields=list(_OUTPUT_FIELDS),
+            consistency_level="Session",  # sees this client's own upserts without a flush
         )
 
         hits = []
-        if results and len(results) > 0:
-            for hit in results[0]:
-                fields = hit.entity.get("fields", None) or hit  # compatibility
-                hits.append({
-                    "chunk_id": fields["chunk_id"] if isinstance(fields, dict) else hit.entity.get("chunk_id"),
-                    "text": fields["text"] if isinstance(fields, dict) else hit.entity.get("text"),
-                    "tokens": int(fields["tokens"] if isinstance(fields, dict) else hit.entity.get("tokens")),
-                    "embedding_model": fields["embedding_model"] if isinstance(fields, dict) else hit.entity.get("embedding_model"),
-                    "url": fields["url"] if isinstance(fields, dict) else hit.entity.get("url"),
-                    "title": fields["title"] if isinstance(fields, dict) else hit.entity.get("title"),
-                    "section": fields["section"] if isinstance(fields, dict) else hit.entity.get("section"),
-                    "score": float(hit.distance),
-                })
+        if not results or len(results) == 0 or len(results[0]) == 0:
+            return hits
+
+        # Result format depends on the pymilvus version: detect it once, not per field per hit
+        first = results[0][0]
+        use_dict = isinstance(first.entity.get("fields", None) or first, dict)  # compatibility
+        for hit in results[0]:
+            if use_dict:
+                fields = hit.entity.get("fields", None) or hit
+                values = [fields[name] for name in _OUTPUT_FIELDS]
+            else:
+                entity = hit.entity
+                values = [entity.get(name) for name in _OUTPUT_FIELDS]
+            row = dict(zip(_OUTPUT_FIELDS, values))
+            row["tokens"] = int(row["tokens"])
+            row["score"] = float(hit.distance)
+            hits.append(row)
         return hits
 
     def purge(self, topic: str) -> None:
@@ -150,13 +238,13 @@ class MilvusStore:
         #     return Collection(self.collection_name)
 
         # NEW:
-        if utility.has_collection(self.collection_name):
-            return Collection(self.collection_name)
+        if utility.has_collection(self.collection_name, using=self.alias):
+            return Collection(self.collection_name, using=self.alias)
 
-        # Define schema (unchanged) ...
+        # Define schema: topic is the partition key, embedding is _VEC_FIELD_TYPE (FLOAT16_VECTOR)
         fields = [
             FieldSchema(name="chunk_id", dtype=DataType.VARCHAR, is_primary=True, auto_id=False, max_length=128),
-            FieldSchema(name="topic", dtype=DataType.VARCHAR, max_length=256),
+            FieldSchema(name="topic", dtype=DataType.VARCHAR, max_length=256, is_partition_key=True),
             FieldSchema(name="text", dtype=DataType.VARCHAR, max_length=65535),
             FieldSchema(name="tokens", dtype=DataType.INT64),
             FieldSchema(name="embedding_model", dtype=DataType.VARCHAR, max_length=128),
@@ -164,10 +252,10 @@ class MilvusStore:
             FieldSchema(name="title", dtype=DataType.VARCHAR, max_length=512),
             FieldSchema(name="section", dtype=DataType.VARCHAR, max_length=512),
             FieldSchema(name="ingested_at", dtype=DataType.INT64),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=self.dim),
+            FieldSchema(name="embedding", dtype=_VEC_FIELD_TYPE, dim=self.dim),
         ]
         schema = CollectionSchema(fields=fields, description="Whiteboard chunks (Wikipedia, cleaned & chunked)")
-        col = Collection(name=self.collection_name, schema=schema)
+        col = Collection(name=self.collection_name, schema=schema, using=self.alias, num_partitions=_TOPIC_PARTITIONS)
         return col
 
 
@@ -179,18 +267,16 @@ class MilvusStore:
                 field_name="embedding",
                 index_params={"index_type": _VEC_INDEX_TYPE, "metric_type": _VEC_METRIC, "params": _HNSW_PARAMS},
             )
-        # (Optional) scalar indexes can be added later if needed for frequent filters.
-        # Milvus supports scalar filtering without explicit scalar index; keep MVP simple. :contentReference[oaicite:6]{index=6}
-
-    def _delete_by_ids(self, chunk_ids: List[str]) -> None:
-        if not chunk_ids:
-            return
-        # Milvus delete supports boolean expressions; use IN list batching
-        # chunk_id is a string primary key; wrap values in quotes.
-        # Split into manageable batches to avoid overly long exprs.
-        B = 500
-        for i in range(0, len(chunk_ids), B):
-            batch = chunk_ids[i : i + B]
-            quoted = ",".join([f'"{cid}"' for cid in batch])
-            expr = f"chunk_id in [{quoted}]"
-            self.col.delete(expr)
\ No newline at end of file
+        # Scalar index for the topic filter used by search / is_indexed / purge.
+        # Best-effort: without it Milvus still filters, just by comparing rows. :contentReference[oaicite:6]{index=6}
+        if not any(idx.field_name == "topic" for idx in existing):
+            for index_type in _TOPIC_INDEX_TYPES:
+                try:
+                    self.col.create_index(
+                        field_name="topic",
+                        index_name="topic_idx",
+                        index_params={"index_type": index_type},
+                    )
+                    break
+                except MilvusException:
+                    continue
@@ -2,14 +2,14 @@
 from __future__ import annotations
 
 import hashlib
+from functools import lru_cache
 from typing import Dict, List, Optional
 
 from transformers import AutoTokenizer
 
-def _sha1(s: str) -> str:
-    return hashlib.sha1(s.encode("utf-8")).hexdigest()
-
+@lru_cache(maxsize=4)
 def _get_tokenizer(model_name: str) -> AutoTokenizer:
+    # Loaded once per process per model (tokenizer.json parse is not free)
     # Use the same family as the embedder to avoid silent truncation
     tok = AutoTokenizer.from_pretrained(model_name, use_fast=True)
     # Some ST models expose max_seq_length=256; use tokenizer.model_max_length as a hint
@@ -40,10 +40,6 @@ def _window_token_ids(
         start += step
     return spans
 
-def _decode_slice(tok: AutoTokenizer, ids: List[int]) -> str:
-    # Decode a slice *without* adding special tokens to keep plain text
-    return tok.decode(ids, skip_special_tokens=True, clean_up_tokenization_spaces=True).strip()
-
 def chunk_sections(
     sections: List[Dict],
     *,
@@ -51,6 +47,7 @@ def chunk_sections(
     overlap: int = 32,
     model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
     min_chars: int = 80,   # drop tiny fragments
+    section_counts: Optional[Dict[str, int]] = None,
 ) -> List[Dict]:
     """
     Input sections: [{ "title": str|None, "text": str, "url": str }]
@@ -65,6 +62,9 @@ def chunk_sections(
       - Chunks sized by the *embedder's* tokenizer to avoid truncation.
       - `max_tokens` counts WordPiece tokens *including* special tokens in the embedder.
         We reserve 2 tokens ([CLS], [SEP]) for BERT-family models → we window size = max_tokens - 2.
+      - Sections sharing url + title (repeated "History" subsections) get an ordinal in
+        their chunk ids so ids stay unique. Pass the same `section_counts` dict when one
+        article is chunked over several calls.
     """
     assert max_tokens > 8, "max_tokens should be > 8"
     assert overlap >= 0, "overlap must be non-negative"
@@ -75,44 +75,68 @@ def chunk_sections(
     special_reserve = 2
     size_wo_special = max(max_tokens - special_reserve, 1)
 
-    chunks: List[Dict] = []
+    # Filter first so the tokenizer only sees sections we keep
+    kept, raws = [], []
     for sec in sections:
         raw = (sec.get("text") or "").strip()
         if not raw:
             continue
         if len(raw) < min_chars:
             continue
+        kept.append(sec)
+        raws.append(raw)
+    if not kept:
+        return []
+
+    # Tokenize all sections in one call WITHOUT adding special tokens; we manage windows ourselves.
+    # The fast tokenizer encodes the batch in Rust (parallel, no per-call Python overhead) and
+    # returns character offsets, so window text is a slice of the original string (no decode).
+    enc = tok(
+        raws,
+        add_special_tokens=False,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+        return_offsets_mapping=True,
+    )
 
-        # Tokenize WITHOUT adding special tokens; we manage windows ourselves
-        enc = tok(
-            raw,
-            add_special_tokens=False,
-            return_attention_mask=False,
-            return_token_type_ids=False,
-        )
-        ids: List[int] = enc["input_ids"]
+    if section_counts is None:
+        section_counts = {}
 
-        # Make windows over token ids
-        spans = _window_token_ids(ids, size_wo_special, overlap)
+    chunks: List[Dict] = []
+    for sec, raw, ids, offsets in zip(kept, raws, enc["input_ids"], enc["offset_mapping"]):
+        # Make windows over token ids. A section that fits one window (most Wikipedia
+        # sections) is its own chunk: no windowing, and its text needs no slicing.
+        single = len(ids) <= size_wo_special
+        spans = ([(0, len(ids))] if ids else []) if single else _window_token_ids(ids, size_wo_special, overlap)
 
         # Use section URL (includes page URL or page#anchor from wikipedia.py)
         sec_title: Optional[str] = sec.get("title")
         sec_url: str = sec.get("url") or ""
 
-        for i, (a, b) in enumerate(spans):
-            piece_ids = ids[a:b]
-            text = _decode_slice(tok, piece_ids)
+        # Stable chunk id: sha1 of (url | section title | token-start-index | token-end-index).
+        # Repeats of a url|title pair add "#<n>|" so they don't overwrite the first one
+        # (whose ids are unchanged). The per-section prefix is hashed once; each window
+        # only feeds its "start|end" suffix.
+        key = f"{sec_url}|{sec_title or ''}|"
+        nth = section_counts.get(key, 0)
+        section_counts[key] = nth + 1
+        if nth:
+            key += f"#{nth}|"
+        id_prefix = hashlib.sha1(key.encode("utf-8"))
+
+        for a, b in spans:
+            text = raw if single else raw[offsets[a][0] : offsets[b - 1][1]].strip()
             if len(text) < min_chars:
                 continue
 
-            # Stable chunk id: hash of (url | section title | token-start-index | token-end-index)
-            base = f"{sec_url}|{sec_title or ''}|{a}|{b}"
-            cid = _sha1(base)
+            h = id_prefix.copy()
+            h.update(b"%d|%d" % (a, b))
+            cid = h.hexdigest()
 
             chunks.append({
                 "chunk_id": cid,
                 "text": text,
-                "tokens": len(piece_ids) + special_reserve,  # approximate embed-time length
+                "tokens": (b - a) + special_reserve,  # approximate embed-time length
                 "section": sec_title,
                 "url": sec_url,
                 # NOTE: no "title" (page title) here; retrieval.py will fill from article.title
@@ -5,18 +5,22 @@ from typing import Dict, List
 
 # Precompiled regexes for speed & clarity
 _BRACKETED_CITATION = re.compile(r"\[(?:\d+|citation needed)\]", flags=re.IGNORECASE)
-_EXTRA_SPACE = re.compile(r"[ \t\u00A0]+")
+# Only runs that actually change: 2+ blanks, or any tab/NBSP. A lone " " (the
+# overwhelmingly common case) is left alone instead of being replaced by itself.
+_EXTRA_SPACE = re.compile(r" [ \t\u00A0]+|[\t\u00A0][ \t\u00A0]*")
 _MULTI_NL = re.compile(r"\n{3,}")
 
 def _clean_text(t: str) -> str:
     if not t:
         return ""
     # Remove inline citation markers like [12] and [citation needed]
-    t = _BRACKETED_CITATION.sub("", t)
+    if "[" in t:
+        t = _BRACKETED_CITATION.sub("", t)
     # Normalize spaces
     t = _EXTRA_SPACE.sub(" ", t)
     # Collapse excessive newlines to at most two
-    t = _MULTI_NL.sub("\n\n", t)
+    if "\n\n\n" in t:
+        t = _MULTI_NL.sub("\n\n", t)
     # Strip outer whitespace
     return t.strip()
 
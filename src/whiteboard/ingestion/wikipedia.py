@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+from collections import deque
 from typing import Dict, List, Optional
-from urllib.parse import quote
+from urllib.parse import quote_from_bytes
 
 import wikipediaapi
 
@@ -23,19 +24,26 @@ def _wiki_client(lang: str = "en") -> wikipediaapi.Wikipedia:
     )
 
 
+_WIKI_BASE = "https://{lang}.wikipedia.org/wiki/"
+# Wikipedia titles and anchors use underscores for spaces
+_SPACE_TO_UNDERSCORE = str.maketrans(" ", "_")
+
+
 def _page_url(title: str, lang: str = "en") -> str:
-    base = f"https://{lang}.wikipedia.org/wiki/"
-    return base + quote(title.replace(" ", "_"))
+    return _WIKI_BASE.format(lang=lang) + quote_from_bytes(title.translate(_SPACE_TO_UNDERSCORE).encode("utf-8"))
 
 def _section_anchor(title: str) -> str:
     # Wikipedia anchors use underscores; quoting handles punctuation safely.
-    return "#" + quote(title.replace(" ", "_"))
+    return "#" + quote_from_bytes(title.translate(_SPACE_TO_UNDERSCORE).encode("utf-8"))
 
 def _collect_sections(node, page_title: str, page_url: str) -> List[Dict]:
+    # Iterative pre-order DFS (same order as recursing, no recursion-limit risk)
     out: List[Dict] = []
-    for s in node.sections:
+    stack = deque(reversed(node.sections))
+    while stack:
+        s = stack.pop()
         if s.title and s.title.strip().lower() in _BLACKLIST_SECTIONS:
-            # skip low-signal sections
+            # skip low-signal sections (and their subsections)
             continue
         # Section text is already plaintext with wikipediaapi
         out.append({
@@ -43,8 +51,8 @@ def _collect_sections(node, page_title: str, page_url: str) -> List[Dict]:
             "text": s.text or "",
             "url": page_url + (_section_anchor(s.title) if s.title else ""),
         })
-        # Recurse into subsections
-        out.extend(_collect_sections(s, page_title, page_url))
+        # Visit subsections next, in document order
+        stack.extend(reversed(s.sections))
     return out
 
 def fetch(topic: str, lang: str = "en") -> Dict:
@@ -1,14 +1,18 @@
 # src/whiteboard/retrieval.py
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional
+import threading
 import time
 
+import numpy as np
+
 # Source adapters / processing
 from .ingestion.wikipedia import fetch as wiki_fetch
 from .ingestion.clean import clean_sections
-from .ingestion.chunk import chunk_sections
+from .ingestion.chunk import chunk_sections, _get_tokenizer
 
 # Embeddings and index
 from .embeddings.model import Embedder
@@ -17,6 +21,8 @@ from .index.milvus_store import MilvusStore
 import logging
 logging.getLogger("transformers").setLevel(logging.ERROR)
 
+# Sections per chunk→embed pipeline stage during ingestion
+_INGEST_SECTION_BATCH = 32
 
 
 # ---------- Public schema ----------
@@ -60,6 +66,12 @@ class RetrievalService:
         self.embedder = embedder or Embedder()
         self.chunk_max_tokens = chunk_max_tokens
         self.chunk_overlap = chunk_overlap
+        # Topics known to be in the store (skips the Milvus query on repeat get_chunks).
+        # Kept in sync with this service's own ingest/purge; an empty search evicts the
+        # topic, so rows removed or re-keyed elsewhere trigger a fresh check.
+        self._indexed: set[str] = set()
+        # Warm the chunker's tokenizer cache so the first ingest doesn't pay the load
+        _get_tokenizer(self.embedder.model_name)
 
     # ----- Public entry points -----
 
@@ -89,6 +101,12 @@ class RetrievalService:
 
             # Topic-scoped search
             hits = self.store.search(topic=topic, query_vector=qvec, k=k)
+            if not hits and topic in self._indexed:
+                # Cached entry went stale (e.g. another topic string for the same page
+                # re-keyed its rows): evict, re-check the store / re-ingest, search again.
+                self._indexed.discard(topic)
+                self._ensure_indexed(topic)
+                hits = self.store.search(topic=topic, query_vector=qvec, k=k)
 
             # Expected hit item schema from store:
             # {
@@ -119,26 +137,44 @@ class RetrievalService:
             raise RetrievalError(f"get_chunks failed: {e}") from e
 
     def is_indexed(self, topic: str) -> bool:
-        return self.store.is_indexed(topic.strip())
+        topic = topic.strip()
+        if topic in self._indexed:
+            return True
+        if self.store.is_indexed(topic):
+            self._indexed.add(topic)
+            return True
+        return False
 
     def reingest(self, topic: str) -> None:
         """Force reingestion (useful if sources changed)."""
-        self._ingest(topic.strip(), force=True)
+        topic = topic.strip()
+        self._indexed.discard(topic)
+        self._ingest(topic, force=True)
 
     def purge(self, topic: str) -> None:
         """Optional maintenance: remove a topic from the store."""
-        self.store.purge(topic.strip())
+        topic = topic.strip()
+        self._indexed.discard(topic)
+        self.store.purge(topic)
+
+    def ingest_article(self, topic: str, article: Dict[str, Any], *, force: bool = False) -> None:
+        """
+        Index an already-fetched article (shape of `ingestion.wikipedia.fetch`) under `topic`.
+        Lets batch callers prefetch pages while earlier topics are being embedded.
+        """
+        self._ingest(topic.strip(), force=force, article=article)
 
     # ----- Internal helpers -----
 
     def _ensure_indexed(self, topic: str) -> None:
-        if self.store.is_indexed(topic):
+        if self.is_indexed(topic):
             return
         self._ingest(topic, force=False)
 
-    def _ingest(self, topic: str, *, force: bool) -> None:
-        # 1) Fetch
-        article = wiki_fetch(topic)
+    def _ingest(self, topic: str, *, force: bool, article: Optional[Dict[str, Any]] = None) -> None:
+        # 1) Fetch (unless the caller prefetched it)
+        if article is None:
+            article = wiki_fetch(topic)
         # Expected shape:
         # {
         #   "title": str, "url": str,
@@ -151,23 +187,49 @@ class RetrievalService:
         # 2) Clean
         clean_secs = clean_sections(sections)  # same structure, text cleaned
 
-        # 3) Chunk
-        chunks = chunk_sections(
-            clean_secs,
-            max_tokens=self.chunk_max_tokens,
-            overlap=self.chunk_overlap,
-            model_name=self.embedder.model_name,
-        )
+        # 3) Chunk + 4) Embed, pipelined over section batches: while batch i is embedded
+        # on this thread, batch i+1 is tokenized on a worker (the fast tokenizer releases the GIL).
         # Each chunk:
         # {"chunk_id": str, "text": str, "tokens": int,
         #  "section": Optional[str], "url": str, "title": str}
+        batches = [
+            clean_secs[i : i + _INGEST_SECTION_BATCH]
+            for i in range(0, len(clean_secs), _INGEST_SECTION_BATCH)
+        ]
+        # Identical text (e.g. a lead that repeats a section) is embedded once; every chunk
+        # keeps its own row and points at the shared vector.
+        text_rows: Dict[str, int] = {}  # chunk text -> row among the encoded vectors
+        rows: List[int] = []
+        chunks: List[Dict[str, Any]] = []
+        vector_parts: List[np.ndarray] = []
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            # url|title counts carried across batches so repeated section ids stay unique
+            section_counts: Dict[str, int] = {}
+            pending = pool.submit(self._chunk, batches[0], section_counts) if batches else None
+            for i in range(len(batches)):
+                batch_chunks = pending.result()
+                if i + 1 < len(batches):
+                    pending = pool.submit(self._chunk, batches[i + 1], section_counts)
+                new_texts: List[str] = []
+                for c in batch_chunks:
+                    row = text_rows.get(c["text"])
+                    if row is None:
+                        row = text_rows[c["text"]] = len(text_rows)
+                        new_texts.append(c["text"])
+                    rows.append(row)
+                if new_texts:
+                    vector_parts.append(self.embedder.encode(new_texts))
+                chunks.extend(batch_chunks)
         if not chunks:
             raise RetrievalError("No chunks produced after cleaning")
-
-        # 4) Embed (batched)
-        vectors = self.embedder.encode([c["text"] for c in chunks])
-
-        # 5) Upsert
+        vectors = vector_parts[0] if len(vector_parts) == 1 else np.concatenate(vector_parts)
+        if len(vectors) != len(chunks):
+            vectors = vectors[rows]
+
+        # 5) Upsert (title fallback, model name and timestamp are the same for every row)
+        default_title = article.get("title")
+        model_name = self.embedder.model_name
+        now = int(time.time())
         self.store.upsert(
             topic=topic,
             items=[
@@ -176,28 +238,42 @@ class RetrievalService:
                     text=c["text"],
                     tokens=int(c.get("tokens", 0)),
                     url=c.get("url"),
-                    title=c.get("title", article.get("title")),
+                    title=c.get("title", default_title),
                     section=c.get("section"),
-                    embedding_model=self.embedder.model_name,
-                    ingested_at=int(time.time()),
+                    embedding_model=model_name,
+                    ingested_at=now,
                 )
                 for c in chunks
             ],
             vectors=vectors,
             force=force,
         )
+        self._indexed.add(topic)
+
+    def _chunk(self, sections: List[Dict[str, Any]], section_counts: Dict[str, int]) -> List[Dict[str, Any]]:
+        return chunk_sections(
+            sections,
+            max_tokens=self.chunk_max_tokens,
+            overlap=self.chunk_overlap,
+            model_name=self.embedder.model_name,
+            section_counts=section_counts,
+        )
 
 
 # ---------- Module-level convenience ----------
 
 # A lightweight singleton-style service for callers that don't want to manage instances.
 _service: Optional[RetrievalService] = None
+_service_lock = threading.Lock()
 
 
 def _get_service() -> RetrievalService:
     global _service
     if _service is None:
-        _service = RetrievalService()
+        # Batch callers hit this from worker threads; build the service only once.
+        with _service_lock:
+            if _service is None:
+                _service = RetrievalService()
     return _service
 
 